@@ -0,0 +1,140 @@
+"""
+Micro-batching of concurrent inference requests.
+Coalesces single-sample forward passes into batched model calls.
+"""
+
+import asyncio
+from typing import Callable
+
+import numpy as np
+
+
+class BatcherUnavailableError(RuntimeError):
+    """Raised for requests that cannot be served because the batcher isn't running."""
+
+
+class BatchedInference:
+    """
+    Micro-batching queue for single-sample inference.
+    
+    Request handlers submit (1, ...) inputs and await their results, while a
+    background task collects requests arriving within a short window, runs
+    one batched forward pass and hands each request its slice of the output.
+    This amortizes the fixed per-call overhead of the model under load.
+    """
+    
+    def __init__(
+        self,
+        infer_fn: Callable[[np.ndarray], dict],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005
+    ):
+        """
+        Initialize the batcher.
+        
+        Args:
+            infer_fn: Function mapping a (B, ...) input batch to a dict of
+                arrays with a leading batch dimension
+            max_batch_size: Maximum number of requests per model call
+            max_wait: Seconds to wait for more requests after the first one
+        """
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = None
+        self._task = None
+        self._inflight = []
+    
+    def start(self):
+        """Start the background batching task on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._batcher_loop())
+    
+    async def stop(self):
+        """Stop the background task, failing any pending requests."""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._fail_pending("Batched inference stopped")
+    
+    def _fail_pending(self, message: str):
+        """Fail the collected batch and every queued request."""
+        pending = [future for _, future in self._inflight]
+        self._inflight = []
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            pending.append(future)
+        
+        for future in pending:
+            if not future.done():
+                future.set_exception(BatcherUnavailableError(message))
+    
+    async def infer(self, input_image: np.ndarray) -> dict:
+        """
+        Submit a single input (1, ...) and wait for its outputs.
+        
+        The input is copied, so callers may reuse their buffer immediately.
+        
+        Returns:
+            Dictionary of output arrays, each with a batch dimension of 1
+        
+        Raises:
+            BatcherUnavailableError: If the batching task is not running
+        """
+        if self._task is None:
+            raise BatcherUnavailableError("Batched inference not started")
+        if self._task.done():
+            raise BatcherUnavailableError("Batched inference task has stopped")
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((np.array(input_image, copy=True), future))
+        return await future
+    
+    async def _collect_batch(self) -> list:
+        """Wait for a first request, then gather any arriving within max_wait."""
+        # Tracked as in flight so a cancellation here can still fail them
+        batch = self._inflight = [await self._queue.get()]
+        
+        if self.max_batch_size > 1 and self.max_wait > 0:
+            await asyncio.sleep(self.max_wait)
+        
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        
+        return batch
+    
+    async def _batcher_loop(self):
+        """Run batched inference and fan results out to waiting requests."""
+        try:
+            while True:
+                batch = await self._collect_batch()
+                self._run_batch(batch)
+                self._inflight = []
+        except asyncio.CancelledError:
+            self._fail_pending("Batched inference stopped")
+            raise
+    
+    def _run_batch(self, batch: list):
+        """Run one batched forward pass and resolve its requests."""
+        # Any failure, including inputs that cannot be stacked, goes to
+        # this batch's requests instead of killing the loop
+        try:
+            inputs = np.concatenate([input_image for input_image, _ in batch], axis=0)
+            outputs = self.infer_fn(inputs)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result({
+                    name: output[i:i + 1] for name, output in outputs.items()
+                })
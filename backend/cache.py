@@ -0,0 +1,53 @@
+"""
+In-memory caching shared by the API and the preprocessing pipeline.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Small in-memory LRU cache with optional time-based expiry.
+    
+    Used to return previous responses (and preprocessed inputs) for
+    identical drawings without re-running inference. Safe to share
+    between threads.
+    """
+    
+    def __init__(self, maxsize: int = 256, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            
+            timestamp, value = entry
+            if self.ttl > 0 and time.monotonic() - timestamp > self.ttl:
+                del self._data[key]
+                return None
+            
+            self._data.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entry."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
@@ -8,6 +8,8 @@ import tensorflow as tf
 from tensorflow import keras
 import cv2
 
+from .preprocessing import get_colormap_lut
+
 
 class GradCAM:
     """
@@ -18,49 +20,73 @@ class GradCAM:
     important regions in the image for prediction.
     """
     
-    def __init__(self, model: keras.Model, layer_name: str = 'conv2'):
+    def __init__(
+        self,
+        model: keras.Model,
+        layer_name: str = 'conv2',
+        feature_model: keras.Model = None
+    ):
         """
         Initialize Grad-CAM with a model and target layer.
         
         Args:
             model: Trained Keras model
             layer_name: Name of the convolutional layer to use for Grad-CAM
+            feature_model: Existing multi-output model (see
+                create_feature_extraction_model) with named outputs including
+                layer_name and 'predictions'. Reused instead of building a
+                separate gradient model when given.
         """
         self.model = model
         self.layer_name = layer_name
         
-        # Create a model that outputs both the conv layer output and predictions
-        self.grad_model = keras.Model(
-            inputs=model.input,
-            outputs=[
-                model.get_layer(layer_name).output,
-                model.output
+        if feature_model is None or layer_name not in feature_model.output:
+            # Create a model that outputs both the conv layer output and predictions
+            feature_model = keras.Model(
+                inputs=model.input,
+                outputs={
+                    layer_name: model.get_layer(layer_name).output,
+                    'predictions': model.output
+                }
+            )
+        self.feature_model = feature_model
+        
+        # Trace the heatmap computation once with a fixed MNIST input
+        # signature so repeated calls run as a single graph without retracing
+        self._heatmap_fn = tf.function(
+            self._compute_heatmap,
+            input_signature=[
+                tf.TensorSpec((1, 28, 28, 1), tf.float32),
+                tf.TensorSpec((), tf.int32)
             ]
         )
+
     
-    def generate_heatmap(
-        self,
-        input_image: np.ndarray,
-        class_idx: int = None
-    ) -> np.ndarray:
+    def _compute_heatmap(self, input_image: tf.Tensor, class_idx: tf.Tensor) -> tuple:
         """
-        Generate a Grad-CAM heatmap for the input image.
+        Compute the normalized Grad-CAM heatmap inside a TF graph.
         
         Args:
             input_image: Preprocessed input image (1, 28, 28, 1)
-            class_idx: Target class index. If None, uses the predicted class.
+            class_idx: Target class index, or a negative value for the
+                predicted class
         
         Returns:
-            Heatmap as a 2D numpy array
+            Tuple of (heatmap, predictions) tensors
         """
         # Use GradientTape to record gradients
         with tf.GradientTape() as tape:
             # Get conv layer output and model predictions
-            conv_output, predictions = self.grad_model(input_image)
+            outputs = self.feature_model(input_image)
+            conv_output = outputs[self.layer_name]
+            predictions = outputs['predictions']
             
             # If no class specified, use the predicted class
-            if class_idx is None:
-                class_idx = tf.argmax(predictions[0])
+            class_idx = tf.where(
+                class_idx < 0,
+                tf.argmax(predictions[0], output_type=tf.int32),
+                class_idx
+            )
             
             # Get the score for the target class
             class_score = predictions[:, class_idx]
@@ -68,11 +94,12 @@ class GradCAM:
         # Compute gradients of the class score with respect to conv output
         grads = tape.gradient(class_score, conv_output)
         
-        # Global average pooling of gradients
-        pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
+        # Global average pooling of gradients (in float32 to avoid float16
+        # overflow under mixed precision)
+        pooled_grads = tf.reduce_mean(tf.cast(grads, tf.float32), axis=(0, 1, 2))
         
         # Weight the conv output channels by their importance
-        conv_output = conv_output[0]
+        conv_output = tf.cast(conv_output[0], tf.float32)
         heatmap = conv_output @ pooled_grads[..., tf.newaxis]
         heatmap = tf.squeeze(heatmap)
         
@@ -82,6 +109,43 @@ class GradCAM:
         # Normalize to 0-1 range
         heatmap = heatmap / (tf.reduce_max(heatmap) + keras.backend.epsilon())
         
+        return heatmap, predictions
+    
+    def generate_heatmap(
+        self,
+        input_image: np.ndarray,
+        class_idx: int = None,
+        return_predictions: bool = False
+    ):
+        """
+        Generate a Grad-CAM heatmap for the input image.
+        
+        Args:
+            input_image: Preprocessed input image (1, 28, 28, 1)
+            class_idx: Target class index. If None, uses the predicted class.
+            return_predictions: Also return the model predictions computed
+                during the forward pass
+        
+        Returns:
+            Heatmap as a 2D numpy array, or a tuple of (heatmap, predictions)
+            if return_predictions is True
+        
+        Raises:
+            ValueError: If class_idx is not a valid class index
+        """
+        num_classes = self.model.output_shape[-1]
+        if class_idx is not None and not 0 <= class_idx < num_classes:
+            raise ValueError(f"class_idx must be in [0, {num_classes - 1}], got {class_idx}")
+        
+        # A negative index tells the traced function to use the predicted class
+        if class_idx is None:
+            class_idx = -1
+        class_idx = tf.constant(class_idx, dtype=tf.int32)
+        
+        heatmap, predictions = self._heatmap_fn(input_image, class_idx)
+        
+        if return_predictions:
+            return heatmap.numpy(), predictions.numpy()
         return heatmap.numpy()
     
     def generate_overlay(
@@ -89,7 +153,8 @@ class GradCAM:
         input_image: np.ndarray,
         heatmap: np.ndarray,
         alpha: float = 0.4,
-        colormap: int = cv2.COLORMAP_JET
+        colormap: int = cv2.COLORMAP_JET,
+        target_size: tuple = None
     ) -> np.ndarray:
         """
         Generate a colored heatmap overlay on the original image.
@@ -99,6 +164,9 @@ class GradCAM:
             heatmap: Grad-CAM heatmap
             alpha: Blending factor for overlay
             colormap: OpenCV colormap to use
+            target_size: Output (width, height). If None, the overlay has
+                the size of the input image. The heatmap is not resized
+                again if it already has this size.
         
         Returns:
             Blended image with heatmap overlay
@@ -114,19 +182,22 @@ class GradCAM:
         # Scale to 0-255
         img = (img * 255).astype(np.uint8)
         
-        # Resize heatmap to match image size
-        heatmap_resized = cv2.resize(heatmap, (img.shape[1], img.shape[0]))
+        # Bring image and heatmap to the output size in a single resize each
+        if target_size is None:
+            target_size = (img.shape[1], img.shape[0])
+        elif (img.shape[1], img.shape[0]) != tuple(target_size):
+            img = cv2.resize(img, target_size, interpolation=cv2.INTER_LINEAR)
         
-        # Apply colormap to heatmap
-        heatmap_colored = cv2.applyColorMap(
-            (heatmap_resized * 255).astype(np.uint8),
-            colormap
-        )
+        if (heatmap.shape[1], heatmap.shape[0]) != tuple(target_size):
+            heatmap_resized = cv2.resize(heatmap, target_size)
+        else:
+            heatmap_resized = heatmap
         
-        # Convert grayscale image to BGR
-        img_bgr = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        # Apply colormap to heatmap via lookup table
+        heatmap_colored = get_colormap_lut(colormap)[(heatmap_resized * 255).astype(np.uint8)]
         
-        # Blend original image with heatmap
+        # Blend original image with heatmap in a single saturating uint8 pass
+        img_bgr = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
         overlay = cv2.addWeighted(img_bgr, 1 - alpha, heatmap_colored, alpha, 0)
         
         return overlay
@@ -136,7 +207,8 @@ def generate_gradcam_explanation(
     model: keras.Model,
     input_image: np.ndarray,
     class_idx: int = None,
-    layer_name: str = 'conv2'
+    layer_name: str = 'conv2',
+    gradcam: GradCAM = None
 ) -> tuple:
     """
     Generate Grad-CAM explanation for a prediction.
@@ -146,11 +218,14 @@ def generate_gradcam_explanation(
         input_image: Preprocessed input image
         class_idx: Target class (None for predicted class)
         layer_name: Convolutional layer to use
+        gradcam: Pre-built GradCAM instance to reuse (avoids rebuilding
+            the gradient model on every call)
     
     Returns:
         Tuple of (heatmap, overlay_image)
     """
-    gradcam = GradCAM(model, layer_name)
+    if gradcam is None:
+        gradcam = GradCAM(model, layer_name)
     heatmap = gradcam.generate_heatmap(input_image, class_idx)
     overlay = gradcam.generate_overlay(input_image, heatmap)
     
@@ -13,10 +13,16 @@ import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers, Model
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping
 
 
+# Run Conv2D/Dense in float16 on GPUs (tensor cores). CPUs mostly emulate
+# float16, which would make inference slower, so stay in float32 there.
+MIXED_PRECISION = bool(tf.config.list_physical_devices('GPU'))
+if MIXED_PRECISION:
+    keras.mixed_precision.set_global_policy('mixed_float16')
+
+
 def create_cnn_model() -> keras.Model:
     """
     Create an improved CNN model for MNIST digit recognition.
@@ -26,6 +32,9 @@ def create_cnn_model() -> keras.Model:
     - Conv2D (64 filters) -> BatchNorm -> ReLU -> MaxPool  
     - Conv2D (128 filters) -> BatchNorm -> ReLU
     - Flatten -> Dense (256) -> Dropout -> Dense (128) -> Dropout -> Dense (10) -> Softmax
+    
+    The output layer always runs in float32 to keep the softmax numerically
+    stable under mixed precision.
     """
     inputs = layers.Input(shape=(28, 28, 1), name="input_image")
     
@@ -52,7 +61,7 @@ def create_cnn_model() -> keras.Model:
     x = layers.Dropout(0.4, name='dropout1')(x)
     x = layers.Dense(128, activation='relu', name='dense2')(x)
     x = layers.Dropout(0.3, name='dropout2')(x)
-    outputs = layers.Dense(10, activation='softmax', name='predictions')(x)
+    outputs = layers.Dense(10, activation='softmax', name='predictions', dtype='float32')(x)
     
     model = keras.Model(inputs=inputs, outputs=outputs, name='mnist_cnn_improved')
     return model
@@ -71,11 +80,8 @@ def train_model(model_path: str = "mnist_cnn_model.keras") -> keras.Model:
     print("Loading MNIST dataset...")
     (x_train, y_train), (x_test, y_test) = keras.datasets.mnist.load_data()
     
-    # Preprocess data
-    x_train = x_train.astype("float32") / 255.0
-    x_test = x_test.astype("float32") / 255.0
-    
-    # Add channel dimension
+    # Add channel dimension (kept as uint8; scaling to 0-1 happens per
+    # batch in the input pipeline to avoid holding a float32 copy)
     x_train = np.expand_dims(x_train, -1)
     x_test = np.expand_dims(x_test, -1)
     
@@ -83,15 +89,14 @@ def train_model(model_path: str = "mnist_cnn_model.keras") -> keras.Model:
     print(f"Test data shape: {x_test.shape}")
     
     # Data augmentation for hand-drawn digit variations
-    datagen = ImageDataGenerator(
-        rotation_range=20,          # Random rotation ±20 degrees
-        width_shift_range=0.15,     # Random horizontal shift ±15%
-        height_shift_range=0.15,    # Random vertical shift ±15%
-        zoom_range=0.15,            # Random zoom ±15%
-        shear_range=0.15,           # Shear intensity
-        fill_mode='constant',       # Fill with black
-        cval=0                      # Fill value (black)
-    )
+    augment = keras.Sequential([
+        layers.RandomRotation(20 / 360, fill_mode='constant'),      # Random rotation ±20 degrees
+        layers.RandomTranslation(0.15, 0.15, fill_mode='constant'), # Random shift ±15%
+        layers.RandomZoom(0.15, 0.15, fill_mode='constant'),        # Random zoom ±15%
+    ], name='augmentation')
+    
+    def to_float(x, y):
+        return tf.cast(x, tf.float32) / 255.0, y
     
     # Create and compile model with optimized learning rate
     model = create_cnn_model()
@@ -135,17 +140,38 @@ def train_model(model_path: str = "mnist_cnn_model.keras") -> keras.Model:
     x_train_aug = x_train[val_split:]
     y_train_aug = y_train[val_split:]
     
+    # Input pipelines: batch uint8 images, then scale (and augment) per batch
+    train_ds = (
+        tf.data.Dataset.from_tensor_slices((x_train_aug, y_train_aug))
+        .shuffle(len(x_train_aug))
+        .batch(64)
+        .map(to_float, num_parallel_calls=tf.data.AUTOTUNE)
+        .map(lambda x, y: (augment(x, training=True), y), num_parallel_calls=tf.data.AUTOTUNE)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+    val_ds = (
+        tf.data.Dataset.from_tensor_slices((x_val, y_val))
+        .batch(256)
+        .map(to_float, num_parallel_calls=tf.data.AUTOTUNE)
+        .prefetch(tf.data.AUTOTUNE)
+    )
+    test_ds = (
+        tf.data.Dataset.from_tensor_slices((x_test, y_test))
+        .batch(256)
+        .map(to_float, num_parallel_calls=tf.data.AUTOTUNE)
+    )
+    
     history = model.fit(
-        datagen.flow(x_train_aug, y_train_aug, batch_size=64),
+        train_ds,
         epochs=30,
-        validation_data=(x_val, y_val),
+        validation_data=val_ds,
         callbacks=callbacks,
         verbose=1
     )
     
     # Evaluate
     print("\nEvaluating model...")
-    test_loss, test_acc = model.evaluate(x_test, y_test, verbose=0)
+    test_loss, test_acc = model.evaluate(test_ds, verbose=0)
     print(f"Test accuracy: {test_acc:.4f}")
     
     # Save model
@@ -162,10 +188,36 @@ def load_model(model_path: str = "mnist_cnn_model.keras") -> keras.Model:
     """
     if os.path.exists(model_path):
         print(f"Loading model from {model_path}")
-        return keras.models.load_model(model_path)
+        model = keras.models.load_model(model_path)
     else:
         print(f"Model not found at {model_path}. Training new model...")
-        return train_model(model_path)
+        model = train_model(model_path)
+    
+    if MIXED_PRECISION:
+        model = convert_to_mixed_precision(model)
+    
+    return model
+
+
+def convert_to_mixed_precision(model: keras.Model) -> keras.Model:
+    """
+    Rebuild a float32 model under the global mixed precision policy.
+    
+    Saved models keep the dtype policy they were trained with, so the
+    architecture is recreated and the trained weights are copied over.
+    Returns the original model if the architectures don't match.
+    """
+    if model.compute_dtype != 'float32':
+        return model
+    
+    mixed_model = create_cnn_model()
+    try:
+        mixed_model.set_weights(model.get_weights())
+    except ValueError:
+        # Fallback for old model compatibility
+        return model
+    
+    return mixed_model
 
 
 def create_feature_extraction_model(base_model: keras.Model) -> keras.Model:
@@ -177,6 +229,7 @@ def create_feature_extraction_model(base_model: keras.Model) -> keras.Model:
     - conv3: Third convolutional layer
     - dense1: First dense layer
     - predictions: Final softmax output
+    - top1: Predicted class index (argmax of predictions, computed in-graph)
     """
     # Check if we have the new or old model
     try:
@@ -192,6 +245,12 @@ def create_feature_extraction_model(base_model: keras.Model) -> keras.Model:
         'dense1': base_model.get_layer('dense1').output,
         'predictions': base_model.get_layer('predictions').output,
     }
+    # Named layer so the output keeps its name in exported (TFLite) signatures
+    layer_outputs['top1'] = layers.Lambda(
+        lambda predictions: tf.argmax(predictions, axis=-1),
+        name='top1',
+        dtype='float32'
+    )(layer_outputs['predictions'])
     
     feature_model = Model(
         inputs=base_model.input,
@@ -201,6 +260,137 @@ def create_feature_extraction_model(base_model: keras.Model) -> keras.Model:
     return feature_model
 
 
+class CompiledFeatureModel:
+    """
+    XLA-compiled inference wrapper around the feature extraction model.
+    
+    XLA fuses the conv/batch-norm/activation chains into a few kernels,
+    cutting intermediate memory traffic and per-op launch overhead.
+    
+    XLA compiles a separate executable per batch size, which takes tens to
+    hundreds of milliseconds. Batches are therefore zero-padded up to a
+    fixed set of bucket sizes (powers of two up to max_batch_size), so at
+    most a handful of executables exist and warmup() can build all of
+    them at startup.
+    """
+    
+    def __init__(self, feature_model: keras.Model, max_batch_size: int = 32):
+        """
+        Wrap a Keras feature extraction model.
+        
+        Args:
+            feature_model: Model with multiple named outputs
+            max_batch_size: Largest batch size that will be padded to a
+                bucket; larger batches run unpadded
+        """
+        self.feature_model = feature_model
+        self.buckets = [
+            1 << i for i in range(max(max_batch_size, 1).bit_length())
+            if 1 << i < max_batch_size
+        ] + [max(max_batch_size, 1)]
+        self._infer = tf.function(
+            lambda input_image: feature_model(input_image, training=False),
+            input_signature=[tf.TensorSpec((None, 28, 28, 1), tf.float32)],
+            jit_compile=True
+        )
+    
+    def warmup(self):
+        """Compile the executable for every bucket size."""
+        for size in self.buckets:
+            self._infer(tf.zeros((size, 28, 28, 1), tf.float32))
+    
+    def __call__(self, input_image, training: bool = False) -> dict:
+        """
+        Run compiled inference and return a dict of named output tensors.
+        """
+        input_image = tf.convert_to_tensor(input_image, tf.float32)
+        batch_size = input_image.shape[0]
+        bucket = next((size for size in self.buckets if size >= batch_size), batch_size)
+        
+        if bucket == batch_size:
+            return self._infer(input_image)
+        
+        padded = tf.pad(input_image, [[0, bucket - batch_size], [0, 0], [0, 0], [0, 0]])
+        outputs = self._infer(padded)
+        return {name: output[:batch_size] for name, output in outputs.items()}
+
+
+def quantize_model(
+    model: keras.Model,
+    output_path: str = "mnist_cnn_model_int8.tflite",
+    num_samples: int = 100
+) -> str:
+    """
+    Convert the feature extraction model to an int8-quantized TFLite model.
+    
+    The multi-output feature model is converted (rather than the base
+    model) so the intermediate activations needed by /scan are available
+    as named signature outputs. Weights and activations are quantized to
+    int8 using a subset of MNIST training images as the representative
+    dataset; inputs and outputs stay float32.
+    
+    Args:
+        model: Trained Keras model
+        output_path: Where to write the .tflite file
+        num_samples: Number of MNIST images used for calibration
+    
+    Returns:
+        Path to the written TFLite model
+    """
+    (x_train, _), _ = keras.datasets.mnist.load_data()
+    samples = np.expand_dims(x_train[:num_samples].astype("float32") / 255.0, -1)
+    
+    def representative_dataset():
+        for sample in samples:
+            yield [sample[np.newaxis]]
+    
+    converter = tf.lite.TFLiteConverter.from_keras_model(
+        create_feature_extraction_model(model)
+    )
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    print(f"Quantized model saved to {output_path}")
+    
+    return output_path
+
+
+class TFLiteFeatureModel:
+    """
+    Forward-only stand-in for the feature extraction model backed by a
+    quantized TFLite interpreter.
+    
+    The TFLite runtime uses XNNPACK for CPU kernels by default. It cannot
+    provide gradients, so Grad-CAM still needs the Keras model.
+    """
+    
+    def __init__(self, model_path: str, num_threads: int = None):
+        """
+        Load a TFLite model written by quantize_model.
+        
+        Args:
+            model_path: Path to the .tflite file
+            num_threads: Number of CPU threads (defaults to all cores)
+        """
+        self.interpreter = tf.lite.Interpreter(
+            model_path=model_path,
+            num_threads=num_threads or os.cpu_count()
+        )
+        self._runner = self.interpreter.get_signature_runner()
+        self._input_name = next(iter(self._runner.get_input_details()))
+    
+    def __call__(self, input_image, training: bool = False) -> dict:
+        """
+        Run inference and return a dict of named output arrays.
+        """
+        return self._runner(**{
+            self._input_name: np.asarray(input_image, dtype=np.float32)
+        })
+
+
 def get_layer_activations(
     feature_model: keras.Model,
     input_image: np.ndarray
@@ -209,23 +399,34 @@ def get_layer_activations(
     Get activations from all intermediate layers.
     
     Args:
-        feature_model: Model with multiple outputs
+        feature_model: Model with multiple outputs (Keras or TFLiteFeatureModel)
         input_image: Preprocessed input image (1, 28, 28, 1)
     
     Returns:
         Dictionary with layer names and their activations
     """
-    outputs = feature_model.predict(input_image, verbose=0)
+    # Call the model directly instead of predict() to skip its batching
+    # machinery for a single sample
+    outputs = feature_model(tf.convert_to_tensor(input_image), training=False)
+    outputs = {name: np.asarray(output) for name, output in outputs.items()}
     
     return {
         'conv1': outputs['conv1'],
         'conv2': outputs['conv2'],
         'conv3': outputs.get('conv3', outputs['conv2']), # Fallback
         'dense1': outputs['dense1'],
-        'predictions': outputs['predictions']
+        'predictions': outputs['predictions'],
+        'top1': outputs['top1']
     }
 
 
 if __name__ == "__main__":
-    # Train model when run directly
-    train_model()
+    import sys
+    
+    if "--quantize" in sys.argv:
+        # Build the int8 TFLite model ahead of time (e.g. during the Docker
+        # build) so the server never downloads calibration data at startup
+        quantize_model(load_model())
+    else:
+        # Train model when run directly
+        train_model()
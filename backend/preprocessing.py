@@ -9,11 +9,59 @@ Enhanced preprocessing pipeline for better recognition of:
 """
 
 import base64
+import hashlib
 import io
+import threading
 import numpy as np
 from PIL import Image, ImageFilter, ImageOps
 import cv2
-from scipy import ndimage
+
+# Structuring elements, built once instead of on every call
+_K3 = np.ones((3, 3), np.uint8)
+_KELL2 = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2))
+
+# Pixel coordinates for center of mass on 28x28 images
+_COORDS_28 = np.arange(28, dtype=np.float64)
+
+# Shared read-only result for images without a digit
+_ZEROS = np.zeros((1, 28, 28, 1), dtype=np.float32)
+_ZEROS.setflags(write=False)
+
+# Per-thread CLAHE instances (apply() writes to internal scratch buffers)
+# and scratch arrays reused across preprocessing calls
+_TLS = threading.local()
+
+
+def _scratch(name: str, shape: tuple, dtype=np.uint8) -> np.ndarray:
+    """
+    Return a per-thread scratch array, reallocated only if shape or dtype change.
+    """
+    arr = getattr(_TLS, name, None)
+    if arr is None or arr.shape != shape or arr.dtype != dtype:
+        arr = np.empty(shape, dtype)
+        setattr(_TLS, name, arr)
+    return arr
+
+# 256-entry BGR lookup tables for OpenCV colormaps, keyed by colormap id
+_COLORMAP_LUTS = {}
+
+
+def get_colormap_lut(colormap: int = cv2.COLORMAP_JET) -> np.ndarray:
+    """
+    Get the (256, 3) BGR lookup table for an OpenCV colormap.
+    Tables are built once and cached.
+    """
+    lut = _COLORMAP_LUTS.get(colormap)
+    if lut is None:
+        lut = cv2.applyColorMap(
+            np.arange(256, dtype=np.uint8)[:, None],
+            colormap
+        ).reshape(256, 3)
+        _COLORMAP_LUTS[colormap] = lut
+    return lut
+
+
+_JET_LUT = get_colormap_lut(cv2.COLORMAP_JET)
 
 
 def base64_to_image(base64_string: str) -> Image.Image:
@@ -30,31 +78,57 @@ def base64_to_image(base64_string: str) -> Image.Image:
     return image
 
 
-def image_to_base64(image: Image.Image, format: str = "PNG") -> str:
+def base64_to_gray_np(base64_string: str) -> np.ndarray:
+    """
+    Decode a base64 encoded image straight to a grayscale uint8 array.
+    Handles data URL prefix if present.
+    
+    Decoding and grayscale conversion happen in one OpenCV pass, skipping
+    the intermediate PIL image and its copies.
+    """
+    raw = base64.b64decode(base64_string.split(",", 1)[-1])
+    image = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_GRAYSCALE)
+    
+    if image is None:
+        raise ValueError("Could not decode image data")
+    return image
+
+
+def image_to_base64(image, format: str = "PNG") -> str:
     """
     Convert a PIL Image to a base64 encoded string.
+    
+    A uint8 numpy array (grayscale, or BGR as used by OpenCV) is encoded
+    directly with cv2.imencode, bypassing PIL.
     """
+    if isinstance(image, np.ndarray):
+        _, encoded = cv2.imencode('.' + format.lower(), image)
+        return base64.b64encode(encoded.tobytes()).decode("utf-8")
+    
     buffer = io.BytesIO()
     image.save(buffer, format=format)
     return base64.b64encode(buffer.getvalue()).decode("utf-8")
 
 
-def numpy_to_base64(array: np.ndarray, normalize: bool = True) -> str:
+def numpy_to_base64(array: np.ndarray, normalize: bool = True, compression: int = 1) -> str:
     """
     Convert a numpy array to a base64 encoded PNG image.
     Useful for feature maps and heatmaps.
+    
+    Uses a low PNG compression level by default: for small maps the size
+    gain of stronger compression is negligible but encoding is much slower.
     """
     if normalize:
-        # Normalize to 0-255 range
-        array = array - array.min()
-        if array.max() > 0:
-            array = array / array.max()
-        array = (array * 255).astype(np.uint8)
+        # Normalize to 0-255 range and convert to uint8 in one pass
+        if array.dtype == np.float16:
+            # OpenCV has no min/max kernels for half floats (mixed precision)
+            array = array.astype(np.float32)
+        array = cv2.normalize(array, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
     else:
-        array = array.astype(np.uint8)
+        array = array.astype(np.uint8, copy=False)
     
-    image = Image.fromarray(array)
-    return image_to_base64(image)
+    _, png = cv2.imencode('.png', array, [cv2.IMWRITE_PNG_COMPRESSION, compression])
+    return base64.b64encode(png.tobytes()).decode("utf-8")
 
 
 def remove_small_components(binary_img: np.ndarray, min_size: int = 50) -> np.ndarray:
@@ -62,9 +136,14 @@ def remove_small_components(binary_img: np.ndarray, min_size: int = 50) -> np.nd
     Remove small connected components (noise) from binary image.
     Keeps only the largest connected component.
     """
-    # Find connected components
+    # Find connected components. 16-bit labels halve the label image
+    # traffic; they are safe whenever the largest possible number of
+    # 8-connected components (isolated pixels on every other row and
+    # column) fits in 16 bits
+    h, w = binary_img.shape
+    ltype = cv2.CV_16U if ((h + 1) // 2) * ((w + 1) // 2) < 65535 else cv2.CV_32S
     num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
-        binary_img, connectivity=8
+        binary_img, connectivity=8, ltype=ltype
     )
     
     if num_labels <= 1:
@@ -76,13 +155,10 @@ def remove_small_components(binary_img: np.ndarray, min_size: int = 50) -> np.nd
         return binary_img
     
     # Get the largest component
-    largest_label = 1 + np.argmax(areas)
-    
-    # Create mask for the largest component
-    result = np.zeros_like(binary_img)
-    result[labels == largest_label] = 255
+    largest_label = 1 + int(np.argmax(areas))
     
-    return result
+    # 0/255 uint8 mask of the largest component in one native pass
+    return cv2.compare(labels, largest_label, cv2.CMP_EQ)
 
 
 def thin_stroke(binary_img: np.ndarray, iterations: int = 2) -> np.ndarray:
@@ -90,70 +166,48 @@ def thin_stroke(binary_img: np.ndarray, iterations: int = 2) -> np.ndarray:
     Apply morphological thinning to normalize stroke width.
     This helps with varying stroke widths from different drawing styles.
     """
-    kernel = np.ones((3, 3), np.uint8)
-    
     # Dilate first to connect broken strokes
-    dilated = cv2.dilate(binary_img, kernel, iterations=1)
+    if iterations < 1:
+        return cv2.dilate(binary_img, _K3, iterations=1)
     
-    # Then erode to thin
-    eroded = cv2.erode(dilated, kernel, iterations=iterations)
+    # Then erode to thin; the first dilate/erode pair is a single closing
+    closed = cv2.morphologyEx(binary_img, cv2.MORPH_CLOSE, _K3)
     
-    return eroded
+    if iterations > 1:
+        return cv2.erode(closed, _K3, iterations=iterations - 1)
+    return closed
 
 
-def normalize_stroke_width(binary_img: np.ndarray) -> np.ndarray:
-    """
-    Normalize stroke width using skeletonization followed by controlled dilation.
-    This ensures consistent stroke width regardless of how thick the user draws.
-    """
-    # Skeletonize using morphological operations
-    skeleton = np.zeros_like(binary_img)
-    temp = binary_img.copy()
-    
-    kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
-    
-    while True:
-        eroded = cv2.erode(temp, kernel)
-        temp_opened = cv2.dilate(eroded, kernel)
-        subset = cv2.subtract(temp, temp_opened)
-        skeleton = cv2.bitwise_or(skeleton, subset)
-        temp = eroded.copy()
-        
-        if cv2.countNonZero(temp) == 0:
-            break
-    
-    # Dilate skeleton to get consistent stroke width (similar to MNIST)
-    dilation_kernel = np.ones((2, 2), np.uint8)
-    normalized = cv2.dilate(skeleton, dilation_kernel, iterations=1)
-    
-    return normalized
-
-
-def enhance_contrast(gray_img: np.ndarray) -> np.ndarray:
+def enhance_contrast(gray_img: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
     """
     Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
     for better contrast in varying lighting conditions.
+    If `dst` is given, the result is written into it.
     """
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4))
-    return clahe.apply(gray_img)
+    clahe = getattr(_TLS, "clahe", None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4))
+        _TLS.clahe = clahe
+    return clahe.apply(gray_img, dst=dst)
 
 
-def adaptive_threshold(gray_img: np.ndarray) -> np.ndarray:
+def adaptive_threshold(gray_img: np.ndarray, dst: np.ndarray = None) -> np.ndarray:
     """
     Apply adaptive thresholding with Otsu's method for better binarization.
     Falls back to adaptive threshold if Otsu fails.
+    If `dst` is given, the result is written into it.
     """
     # First try Otsu's method
-    _, otsu = cv2.threshold(gray_img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    _, otsu = cv2.threshold(gray_img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)
     
     # Check if Otsu produced reasonable result
-    white_ratio = np.sum(otsu > 0) / otsu.size
+    white_ratio = cv2.countNonZero(otsu) / otsu.size
     
     if white_ratio < 0.01 or white_ratio > 0.9:
         # Otsu failed, use adaptive threshold
         binary = cv2.adaptiveThreshold(
             gray_img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY, 11, 2
+            cv2.THRESH_BINARY, 11, 2, dst=dst
         )
     else:
         binary = otsu
@@ -164,14 +218,18 @@ def adaptive_threshold(gray_img: np.ndarray) -> np.ndarray:
 def center_digit_by_mass(img_28x28: np.ndarray) -> np.ndarray:
     """
     Center digit using center of mass calculation.
-    Uses scipy for more accurate moment calculation.
+    The intensity-weighted mean row/column is computed with two dot
+    products against the pixel coordinates.
     """
     # Calculate center of mass
-    cy, cx = ndimage.center_of_mass(img_28x28)
+    total = img_28x28.sum(dtype=np.float64)
     
-    if np.isnan(cx) or np.isnan(cy):
+    if total <= 0:
         return img_28x28
     
+    cy = (img_28x28.sum(axis=1, dtype=np.float64) @ _COORDS_28) / total
+    cx = (img_28x28.sum(axis=0, dtype=np.float64) @ _COORDS_28) / total
+    
     # Target center is (13.5, 13.5) for 28x28 image
     shift_x = int(13.5 - cx)
     shift_y = int(13.5 - cy)
@@ -183,7 +241,167 @@ def center_digit_by_mass(img_28x28: np.ndarray) -> np.ndarray:
     return centered
 
 
-def preprocess_for_mnist(image: Image.Image) -> np.ndarray:
+def _opencv_stages(img_array: np.ndarray):
+    """
+    Run the OpenCV part of the MNIST pipeline on a grayscale image.
+    Intermediate images are written to per-thread scratch buffers, so the
+    returned crop is only valid until the next call on the same thread.
+    
+    Returns:
+        The padded binary crop around the digit, or None if the image
+        contains no digit
+    """
+    # Step 2: Determine and correct background/foreground
+    # The four corners of a drawn digit are background, so their mean
+    # tells light from dark backgrounds without a full histogram pass
+    corners = (
+        int(img_array[0, 0]) + int(img_array[0, -1])
+        + int(img_array[-1, 0]) + int(img_array[-1, -1])
+    )
+    
+    if corners > 4 * 127:
+        # Light background, dark strokes - invert
+        img_array = cv2.bitwise_not(img_array, dst=_scratch("inverted", img_array.shape))
+    
+    # Blank canvas: skip the rest of the pipeline
+    mask = cv2.compare(img_array, 20, cv2.CMP_GT, dst=_scratch("mask", img_array.shape))
+    if cv2.countNonZero(mask) < 10:
+        return None
+    
+    # Step 3: Enhanced contrast using CLAHE
+    img_enhanced = enhance_contrast(img_array, dst=_scratch("enhanced", img_array.shape))
+    
+    # Step 4: Adaptive thresholding with Otsu
+    binary = adaptive_threshold(img_enhanced, dst=_scratch("binary", img_array.shape))
+    
+    # Step 5: Remove small noise components
+    binary = remove_small_components(binary)
+    
+    # Check if we have any content
+    if cv2.countNonZero(binary) < 10:
+        return None
+    
+    # Step 6: Apply gentle morphological operations
+    # Close small gaps in strokes
+    binary = cv2.morphologyEx(
+        binary, cv2.MORPH_CLOSE, _KELL2, dst=_scratch("closed", binary.shape)
+    )
+    
+    # Step 7: Find bounding box with padding
+    x_min, y_min, box_w, box_h = cv2.boundingRect(binary)
+    
+    if box_w == 0 or box_h == 0:
+        return None
+    
+    x_max = x_min + box_w - 1
+    y_max = y_min + box_h - 1
+    
+    # Add small padding around the digit
+    padding = 2
+    h, w = img_array.shape
+    y_min = max(0, y_min - padding)
+    x_min = max(0, x_min - padding)
+    y_max = min(h - 1, y_max + padding)
+    x_max = min(w - 1, x_max + padding)
+    
+    # Extract digit region
+    return binary[y_min:y_max + 1, x_min:x_max + 1]
+
+
+def _place_digit(digit: np.ndarray) -> np.ndarray:
+    """
+    Scale a binary digit crop into a 20x20 box and center it by mass on the
+    28x28 canvas.
+    
+    The center-of-mass shift is computed from the resized digit, which is
+    then copied straight to its final position with a single clipped slice
+    assignment, replacing the separate canvas placement and shift warp.
+    The result is identical to resizing, placing and then shifting.
+    
+    Returns:
+        uint8 28x28 canvas (a per-thread scratch buffer)
+    """
+    # Step 8: Resize preserving aspect ratio
+    digit_h, digit_w = digit.shape
+    
+    # Target size (20x20 with 4px padding each side = 28x28)
+    target_size = 20
+    
+    # Calculate new dimensions preserving aspect ratio
+    aspect_ratio = digit_w / digit_h
+    
+    if digit_h > digit_w:
+        new_h = target_size
+        new_w = max(1, int(target_size * aspect_ratio))
+    else:
+        new_w = target_size
+        new_h = max(1, int(target_size / aspect_ratio))
+    
+    # Use INTER_AREA for downscaling, INTER_CUBIC for upscaling
+    if digit_h > new_h or digit_w > new_w:
+        interpolation = cv2.INTER_AREA
+    else:
+        interpolation = cv2.INTER_CUBIC
+    
+    digit = cv2.resize(
+        digit, (new_w, new_h), dst=_scratch("resized", (new_h, new_w)),
+        interpolation=interpolation
+    )
+    
+    # Step 9: Geometric centering offsets on the 28x28 canvas
+    y_offset = max(0, (28 - new_h) // 2)
+    x_offset = max(0, (28 - new_w) // 2)
+    
+    # Step 10: Center using center of mass (more accurate than geometric center)
+    # Target center is (13.5, 13.5) for 28x28 image
+    total = digit.sum(dtype=np.float64)
+    
+    if total > 0:
+        cy = (digit.sum(axis=1, dtype=np.float64) @ _COORDS_28[y_offset:y_offset + new_h]) / total
+        cx = (digit.sum(axis=0, dtype=np.float64) @ _COORDS_28[x_offset:x_offset + new_w]) / total
+        y_offset += int(13.5 - cy)
+        x_offset += int(13.5 - cx)
+    
+    # Copy the part of the digit that lands inside the canvas
+    canvas = _scratch("canvas", (28, 28))
+    canvas.fill(0)
+    src_y, src_x = max(0, -y_offset), max(0, -x_offset)
+    dst_y, dst_x = max(0, y_offset), max(0, x_offset)
+    copy_h = min(new_h - src_y, 28 - dst_y)
+    copy_w = min(new_w - src_x, 28 - dst_x)
+    
+    if copy_h > 0 and copy_w > 0:
+        canvas[dst_y:dst_y + copy_h, dst_x:dst_x + copy_w] = \
+            digit[src_y:src_y + copy_h, src_x:src_x + copy_w]
+    
+    return canvas
+
+
+def _numpy_tail(canvas: np.ndarray) -> np.ndarray:
+    """
+    Blur and normalize the centered 28x28 canvas into the model input.
+    
+    Returns:
+        Float32 array of shape (1, 28, 28, 1) in the 0-1 range
+    """
+    # Step 11: Apply Gaussian blur for anti-aliasing (mimics MNIST style)
+    canvas = cv2.GaussianBlur(canvas, (3, 3), 0.5, dst=_scratch("blurred", (28, 28)))
+    
+    # Step 12: Re-normalize intensity to full 0-1 range in one pass,
+    # written straight into the (1, 28, 28, 1) output
+    out = np.empty((1, 28, 28, 1), dtype=np.float32)
+    img_normalized = out.reshape(28, 28)
+    
+    peak = int(canvas.max())
+    if peak > 0:
+        np.multiply(canvas, np.float32(1.0 / peak), out=img_normalized)
+    else:
+        np.copyto(img_normalized, canvas)
+    
+    return out
+
+
+def preprocess_for_mnist(image) -> np.ndarray:
     """
     Advanced preprocessing pipeline for MNIST model input.
     
@@ -197,127 +415,80 @@ def preprocess_for_mnist(image: Image.Image) -> np.ndarray:
     1. Convert to grayscale and normalize orientation
     2. Apply adaptive thresholding (Otsu + fallback)
     3. Remove noise and small components
-    4. Normalize stroke width via skeletonization
+    4. Close small gaps in the strokes
     5. Center digit using center of mass
     6. Apply anti-aliasing for smooth edges
     7. Normalize to 0-1 range for model input
+    
+    `image` may be a PIL Image or a uint8 numpy array (grayscale, or BGR as
+    returned by OpenCV).
+    
+    Images without a digit return a shared read-only array of zeros.
     """
     try:
         # Step 1: Convert to grayscale
-        if image.mode != 'L':
-            image = image.convert('L')
-        
-        img_array = np.array(image)
-        
-        # Step 2: Determine and correct background/foreground
-        # Use histogram analysis for better background detection
-        hist = cv2.calcHist([img_array], [0], None, [256], [0, 256]).flatten()
-        background_val = np.argmax(hist)
-        
-        if background_val > 127:
-            # Light background, dark strokes - invert
-            img_array = 255 - img_array
-        
-        # Step 3: Enhanced contrast using CLAHE
-        img_enhanced = enhance_contrast(img_array)
-        
-        # Step 4: Adaptive thresholding with Otsu
-        binary = adaptive_threshold(img_enhanced)
-        
-        # Step 5: Remove small noise components
-        binary = remove_small_components(binary)
-        
-        # Check if we have any content
-        if cv2.countNonZero(binary) < 10:
-            return np.zeros((1, 28, 28, 1), dtype=np.float32)
-        
-        # Step 6: Apply gentle morphological operations
-        # Close small gaps in strokes
-        kernel_close = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2, 2))
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel_close)
-        
-        # Step 7: Find bounding box with padding
-        coords = np.column_stack(np.where(binary > 0))
-        
-        if len(coords) == 0:
-            return np.zeros((1, 28, 28, 1), dtype=np.float32)
-        
-        y_min, x_min = coords.min(axis=0)
-        y_max, x_max = coords.max(axis=0)
-        
-        # Add small padding around the digit
-        padding = 2
-        h, w = img_array.shape
-        y_min = max(0, y_min - padding)
-        x_min = max(0, x_min - padding)
-        y_max = min(h - 1, y_max + padding)
-        x_max = min(w - 1, x_max + padding)
-        
-        # Extract digit region
-        digit = binary[y_min:y_max + 1, x_min:x_max + 1]
-        
-        # Step 8: Resize preserving aspect ratio
-        digit_h, digit_w = digit.shape
-        
-        # Target size (20x20 with 4px padding each side = 28x28)
-        target_size = 20
-        
-        # Calculate new dimensions preserving aspect ratio
-        aspect_ratio = digit_w / digit_h
-        
-        if digit_h > digit_w:
-            new_h = target_size
-            new_w = max(1, int(target_size * aspect_ratio))
+        if isinstance(image, np.ndarray):
+            img_array = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        elif image.mode in ('L', 'RGB', 'RGBA'):
+            # Read PIL pixels directly and let OpenCV do the color conversion
+            arr = np.asarray(image, dtype=np.uint8)
+            if arr.ndim == 2:
+                img_array = arr
+            elif arr.shape[2] == 4:
+                img_array = cv2.cvtColor(arr, cv2.COLOR_RGBA2GRAY)
+            else:
+                img_array = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
         else:
-            new_w = target_size
-            new_h = max(1, int(target_size / aspect_ratio))
+            img_array = np.asarray(image.convert('L'), dtype=np.uint8)
         
-        # Use INTER_AREA for downscaling, INTER_CUBIC for upscaling
-        if digit_h > new_h or digit_w > new_w:
-            interpolation = cv2.INTER_AREA
-        else:
-            interpolation = cv2.INTER_CUBIC
-        
-        digit_resized = cv2.resize(digit, (new_w, new_h), interpolation=interpolation)
-        
-        # Step 9: Place in 28x28 canvas centered
-        canvas = np.zeros((28, 28), dtype=np.uint8)
-        
-        y_offset = (28 - new_h) // 2
-        x_offset = (28 - new_w) // 2
-        
-        # Ensure offsets are non-negative
-        y_offset = max(0, y_offset)
-        x_offset = max(0, x_offset)
-        
-        # Calculate the region to copy
-        copy_h = min(new_h, 28 - y_offset)
-        copy_w = min(new_w, 28 - x_offset)
-        
-        canvas[y_offset:y_offset + copy_h, x_offset:x_offset + copy_w] = digit_resized[:copy_h, :copy_w]
-        
-        # Step 10: Center using center of mass (more accurate than geometric center)
-        canvas = center_digit_by_mass(canvas)
-        
-        # Step 11: Apply Gaussian blur for anti-aliasing (mimics MNIST style)
-        canvas = cv2.GaussianBlur(canvas, (3, 3), 0.5)
+        # Steps 2-7: Clean up and crop the digit
+        digit = _opencv_stages(img_array)
         
-        # Step 12: Re-normalize intensity to full range
-        if canvas.max() > 0:
-            canvas = (canvas.astype(np.float32) / canvas.max() * 255).astype(np.uint8)
+        if digit is None:
+            return _ZEROS
         
-        # Step 13: Normalize to 0-1 range
-        img_normalized = canvas.astype(np.float32) / 255.0
+        # Steps 8-10: Scale and center it on the 28x28 canvas
+        canvas = _place_digit(digit)
         
-        # Add batch and channel dimensions: (1, 28, 28, 1)
-        img_final = np.expand_dims(np.expand_dims(img_normalized, axis=0), axis=-1)
-        
-        return img_final
+        # Steps 11-12: Blur and normalize
+        return _numpy_tail(canvas)
         
     except Exception as e:
         # Log error and return blank image
         print(f"Preprocessing error: {e}")
-        return np.zeros((1, 28, 28, 1), dtype=np.float32)
+        return _ZEROS
+
+
+def preprocess_from_b64(base64_string: str, cache=None) -> np.ndarray:
+    """
+    Decode a base64 image and preprocess it for the model, optionally
+    memoizing the result.
+    
+    Repeated submissions of the same drawing (retries, preview + submit)
+    skip decoding and the whole pipeline when a cache is given. Results
+    are read-only (1, 28, 28, 1) float32 arrays shared between callers.
+    
+    Args:
+        base64_string: Base64 encoded image
+        cache: ResponseCache (see cache.py) keyed by a digest of the
+            payload. If None, nothing is memoized.
+    
+    Returns:
+        Preprocessed array (1, 28, 28, 1)
+    """
+    if cache is not None:
+        key = hashlib.blake2b(base64_string.encode(), digest_size=16).digest()
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    
+    result = preprocess_for_mnist(base64_to_gray_np(base64_string))
+    result.setflags(write=False)
+    
+    if cache is not None:
+        cache.put(key, result)
+    
+    return result
 
 
 def create_heatmap_overlay(
@@ -333,19 +504,16 @@ def create_heatmap_overlay(
     if len(heatmap.shape) > 2:
         heatmap = heatmap.squeeze()
     
-    # Normalize heatmap
-    heatmap = heatmap - heatmap.min()
-    if heatmap.max() > 0:
-        heatmap = heatmap / heatmap.max()
-    
-    # Resize heatmap to match original image
+    # Resize heatmap to match original image (float32 takes OpenCV's
+    # vectorized resize path; float64 does not)
+    heatmap = heatmap.astype(np.float32, copy=False)
     heatmap_resized = cv2.resize(heatmap, (original_image.shape[1], original_image.shape[0]))
     
-    # Apply colormap
-    heatmap_colored = cv2.applyColorMap(
-        (heatmap_resized * 255).astype(np.uint8),
-        cv2.COLORMAP_JET
-    )
+    # Normalize to 0-255 and convert to uint8 in one pass
+    heatmap_u8 = cv2.normalize(heatmap_resized, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+    
+    # Apply colormap via the precomputed lookup table
+    heatmap_colored = _JET_LUT[heatmap_u8]
     
     # Convert original to BGR if grayscale
     if len(original_image.shape) == 2:
@@ -359,11 +527,37 @@ def create_heatmap_overlay(
     return overlay
 
 
-def get_processed_image_base64(image: Image.Image) -> str:
+def get_processed_image_base64(image=None, preprocessed: np.ndarray = None) -> str:
     """
     Get the preprocessed 28x28 image as base64 for visualization.
+    
+    Pass `preprocessed`, the (1, 28, 28, 1) output of preprocess_for_mnist,
+    to skip running the pipeline again on `image`.
+    """
+    _, png = cv2.imencode(
+        '.png', _processed_to_uint8(image, preprocessed), [cv2.IMWRITE_PNG_COMPRESSION, 1]
+    )
+    return base64.b64encode(png.tobytes()).decode("utf-8")
+
+
+def get_processed_image_raw(image=None, preprocessed: np.ndarray = None) -> str:
+    """
+    Get the preprocessed 28x28 image as base64 of its raw uint8 pixels
+    (row-major, 784 bytes).
+    
+    For an image this small, PNG's deflate and CRC overhead outweighs the
+    few bytes it saves, so the pixels are sent as-is and the client
+    rebuilds the image.
+    """
+    return base64.b64encode(_processed_to_uint8(image, preprocessed).tobytes()).decode("utf-8")
+
+
+def _processed_to_uint8(image=None, preprocessed: np.ndarray = None) -> np.ndarray:
+    """
+    Return the preprocessed image as a 28x28 uint8 array, running the
+    pipeline on `image` unless `preprocessed` is given.
     """
-    preprocessed = preprocess_for_mnist(image)
+    if preprocessed is None:
+        preprocessed = preprocess_for_mnist(image)
     # Remove batch and channel dims, scale back to 0-255
-    img_2d = (preprocessed[0, :, :, 0] * 255).astype(np.uint8)
-    return numpy_to_base64(img_2d, normalize=False)
+    return (preprocessed[0, :, :, 0] * 255).astype(np.uint8)
@@ -0,0 +1,8 @@
+"""
+Shared test setup: make the backend package importable from the repo root.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
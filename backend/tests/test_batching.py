@@ -0,0 +1,75 @@
+"""
+Tests for micro-batched inference.
+"""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from backend.batching import BatchedInference, BatcherUnavailableError
+
+
+def _double(inputs: np.ndarray) -> dict:
+    return {'out': inputs * 2, 'size': np.full(len(inputs), len(inputs))}
+
+
+def test_concurrent_requests_get_their_own_slice():
+    async def run():
+        batcher = BatchedInference(_double, max_batch_size=8, max_wait=0.01)
+        batcher.start()
+        inputs = [np.full((1, 2), i, dtype=np.float32) for i in range(5)]
+        results = await asyncio.gather(*[batcher.infer(x) for x in inputs])
+        await batcher.stop()
+        return inputs, results
+    
+    inputs, results = asyncio.run(run())
+    for x, result in zip(inputs, results):
+        np.testing.assert_array_equal(result['out'], x * 2)
+    assert max(int(result['size'][0]) for result in results) > 1
+
+
+def test_mismatched_shapes_fail_the_batch_without_stopping_the_loop():
+    async def run():
+        batcher = BatchedInference(_double, max_batch_size=8, max_wait=0.01)
+        batcher.start()
+        bad = await asyncio.wait_for(asyncio.gather(
+            batcher.infer(np.zeros((1, 2), np.float32)),
+            batcher.infer(np.zeros((1, 3), np.float32)),
+            return_exceptions=True
+        ), 1)
+        good = await asyncio.wait_for(batcher.infer(np.ones((1, 2), np.float32)), 1)
+        await batcher.stop()
+        return bad, good
+    
+    bad, good = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in bad)
+    np.testing.assert_array_equal(good['out'], np.full((1, 2), 2))
+
+
+def test_infer_raises_after_the_task_dies():
+    async def run():
+        batcher = BatchedInference(_double)
+        batcher.start()
+        batcher._task.cancel()
+        await asyncio.sleep(0)
+        with pytest.raises(BatcherUnavailableError):
+            await asyncio.wait_for(batcher.infer(np.zeros((1, 2), np.float32)), 1)
+    
+    asyncio.run(run())
+
+
+def test_stop_fails_the_batch_being_collected():
+    async def run():
+        batcher = BatchedInference(_double, max_batch_size=8, max_wait=10)
+        batcher.start()
+        pending = asyncio.ensure_future(batcher.infer(np.zeros((1, 2), np.float32)))
+        # Let the loop pop the request and start waiting for more
+        await asyncio.sleep(0.01)
+        assert batcher._queue.empty()
+        
+        await batcher.stop()
+        with pytest.raises(BatcherUnavailableError):
+            await asyncio.wait_for(pending, 1)
+    
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+"""
+Tests for the shared LRU cache.
+"""
+
+import time
+
+import numpy as np
+
+from backend.cache import ResponseCache
+from backend.preprocessing import preprocess_from_b64
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_expired_and_disabled_caches_return_nothing():
+    cache = ResponseCache(maxsize=2, ttl=0.01)
+    cache.put('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    
+    disabled = ResponseCache(maxsize=0)
+    disabled.put('a', 1)
+    assert disabled.get('a') is None
+
+
+def test_preprocessing_reuses_the_given_cache():
+    cache = ResponseCache(maxsize=4)
+    image = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAAAAAA6fptVAAAACklEQVR4nGNgAAAAAgABSK+kcQAAAABJRU5ErkJggg=='
+    
+    first = preprocess_from_b64(image, cache=cache)
+    assert preprocess_from_b64(image, cache=cache) is first
+    assert not first.flags.writeable
+    np.testing.assert_array_equal(preprocess_from_b64(image), first)
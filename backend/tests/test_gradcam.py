@@ -0,0 +1,44 @@
+"""
+Tests for the Grad-CAM heatmap paths.
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.gradcam import GradCAM
+from backend.model import create_cnn_model
+
+
+def test_default_class_is_the_predicted_class():
+    gradcam = GradCAM(create_cnn_model(), 'conv2')
+    
+    image = np.random.default_rng(1).random((1, 28, 28, 1), dtype=np.float32)
+    heatmap, predictions = gradcam.generate_heatmap(image, return_predictions=True)
+    
+    assert heatmap.shape == (14, 14)
+    np.testing.assert_array_equal(
+        heatmap, gradcam.generate_heatmap(image, int(np.argmax(predictions[0])))
+    )
+
+
+@pytest.mark.parametrize('class_idx', [-5, -1, 10])
+def test_invalid_class_is_rejected(class_idx):
+    gradcam = GradCAM(create_cnn_model(), 'conv2')
+    
+    image = np.zeros((1, 28, 28, 1), dtype=np.float32)
+    with pytest.raises(ValueError):
+        gradcam.generate_heatmap(image, class_idx)
+
+
+def test_overlay_matches_opencv_colormap_blend():
+    rng = np.random.default_rng(2)
+    image = rng.random((1, 28, 28, 1), dtype=np.float32)
+    heatmap = rng.random((28, 28), dtype=np.float32)
+    
+    img = cv2.cvtColor((image[0, :, :, 0] * 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+    colored = cv2.applyColorMap((heatmap * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    expected = cv2.addWeighted(img, 0.6, colored, 0.4, 0)
+    
+    gradcam = GradCAM.__new__(GradCAM)
+    np.testing.assert_array_equal(gradcam.generate_overlay(image, heatmap), expected)
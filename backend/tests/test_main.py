@@ -0,0 +1,49 @@
+"""
+Tests for the response encoding helpers of the API.
+"""
+
+import base64
+
+import cv2
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from backend.main import ExplainRequest, quantize_feature_maps, upscale_feature_maps
+from backend.preprocessing import numpy_to_base64
+
+
+def _decode_png(data: str) -> np.ndarray:
+    return cv2.imdecode(np.frombuffer(base64.b64decode(data), np.uint8), cv2.IMREAD_UNCHANGED)
+
+
+def test_raw_feature_maps_match_scan_pngs():
+    rng = np.random.default_rng(0)
+    for size in (28, 14):
+        maps = np.maximum(rng.normal(size=(size, size, 16)), 0).astype(np.float32)
+        maps *= rng.random(16, dtype=np.float32) * 5
+        
+        blob, shape, scales, offsets = quantize_feature_maps(maps)
+        raw = np.frombuffer(base64.b64decode(blob), np.uint8).reshape(shape)
+        
+        # /scan encodes nearest-neighbour upscaled maps as PNGs
+        factor = 56 // size
+        upscaled = upscale_feature_maps(maps, 56)
+        for i in range(16):
+            png = _decode_png(numpy_to_base64(upscaled[:, :, i]))
+            np.testing.assert_array_equal(png[::factor, ::factor], raw[i])
+        
+        assert (raw.max(axis=(1, 2)) == 255).all()
+        np.testing.assert_allclose(
+            raw * np.array(scales)[:, None, None] + np.array(offsets)[:, None, None],
+            maps.transpose(2, 0, 1),
+            atol=max(scales) / 2 + 1e-6
+        )
+
+
+def test_explain_request_rejects_invalid_classes():
+    assert ExplainRequest(image='').class_idx is None
+    assert ExplainRequest(image='', class_idx=9).class_idx == 9
+    for class_idx in (-5, -1, 10):
+        with pytest.raises(ValidationError):
+            ExplainRequest(image='', class_idx=class_idx)
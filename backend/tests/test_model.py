@@ -0,0 +1,54 @@
+"""
+Tests for the model wrappers.
+"""
+
+import numpy as np
+from tensorflow import keras
+
+from backend.model import (
+    CompiledFeatureModel,
+    create_cnn_model,
+    create_feature_extraction_model,
+    get_layer_activations,
+)
+
+
+def test_bucket_sizes():
+    feature_model = create_feature_extraction_model(create_cnn_model())
+    assert CompiledFeatureModel(feature_model, 32).buckets == [1, 2, 4, 8, 16, 32]
+    assert CompiledFeatureModel(feature_model, 20).buckets == [1, 2, 4, 8, 16, 20]
+    assert CompiledFeatureModel(feature_model, 1).buckets == [1]
+
+
+def test_padded_batches_match_the_keras_model():
+    feature_model = create_feature_extraction_model(create_cnn_model())
+    compiled = CompiledFeatureModel(feature_model, max_batch_size=8)
+    compiled.warmup()
+    
+    rng = np.random.default_rng(0)
+    for batch_size in (1, 3, 5, 8, 9):
+        inputs = rng.random((batch_size, 28, 28, 1), dtype=np.float32)
+        outputs = get_layer_activations(compiled, inputs)
+        expected = get_layer_activations(feature_model, inputs)
+        
+        for name, value in expected.items():
+            assert outputs[name].shape == value.shape
+            np.testing.assert_allclose(outputs[name], value, rtol=1e-4, atol=1e-5)
+
+
+def test_top1_matches_argmax_under_mixed_precision():
+    keras.mixed_precision.set_global_policy('mixed_float16')
+    try:
+        feature_model = create_feature_extraction_model(create_cnn_model())
+    finally:
+        keras.mixed_precision.set_global_policy('float32')
+    
+    # Casting predictions to float16 would merge near-tied probabilities
+    assert feature_model.get_layer('top1').compute_dtype == 'float32'
+    
+    rng = np.random.default_rng(0)
+    inputs = rng.random((64, 28, 28, 1), dtype=np.float32)
+    outputs = get_layer_activations(feature_model, inputs)
+    np.testing.assert_array_equal(
+        outputs['top1'], np.argmax(outputs['predictions'], axis=-1)
+    )
@@ -0,0 +1,56 @@
+"""
+Tests for the MNIST preprocessing pipeline.
+"""
+
+import cv2
+import numpy as np
+
+from backend.preprocessing import _place_digit
+
+
+def _reference_place_digit(digit: np.ndarray) -> np.ndarray:
+    """The original resize, place, center-of-mass and shift steps."""
+    digit_h, digit_w = digit.shape
+    aspect_ratio = digit_w / digit_h
+    if digit_h > digit_w:
+        new_h, new_w = 20, max(1, int(20 * aspect_ratio))
+    else:
+        new_w, new_h = 20, max(1, int(20 / aspect_ratio))
+    
+    if digit_h > new_h or digit_w > new_w:
+        interpolation = cv2.INTER_AREA
+    else:
+        interpolation = cv2.INTER_CUBIC
+    resized = cv2.resize(digit, (new_w, new_h), interpolation=interpolation)
+    
+    canvas = np.zeros((28, 28), np.uint8)
+    y_offset, x_offset = (28 - new_h) // 2, (28 - new_w) // 2
+    canvas[y_offset:y_offset + new_h, x_offset:x_offset + new_w] = resized
+    
+    total = canvas.sum(dtype=np.float64)
+    if total <= 0:
+        return canvas
+    rows, cols = np.indices(canvas.shape)
+    cy = (rows * canvas).sum() / total
+    cx = (cols * canvas).sum() / total
+    M = np.float32([[1, 0, int(13.5 - cx)], [0, 1, int(13.5 - cy)]])
+    return cv2.warpAffine(canvas, M, (28, 28), borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+def test_place_digit_matches_resize_then_center():
+    rng = np.random.default_rng(3)
+    checked = {'up': 0, 'down': 0}
+    
+    for _ in range(400):
+        # Small crops are enlarged (INTER_CUBIC), large ones shrunk (INTER_AREA)
+        h, w = rng.integers(3, 19, 2) if rng.random() < 0.5 else rng.integers(21, 120, 2)
+        digit = np.zeros((h, w), np.uint8)
+        for _ in range(2):
+            x0, x1 = rng.integers(0, w, 2)
+            y0, y1 = rng.integers(0, h, 2)
+            cv2.line(digit, (int(x0), int(y0)), (int(x1), int(y1)), 255, int(rng.integers(1, 4)))
+        
+        np.testing.assert_array_equal(_place_digit(digit), _reference_place_digit(digit))
+        checked['up' if max(h, w) < 20 else 'down'] += 1
+    
+    assert min(checked.values()) > 100
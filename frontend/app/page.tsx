@@ -4,9 +4,9 @@ import React, { useCallback } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
 import { useStore } from '@/store/useStore';
 import {
-    scanImage,
+    scanImageRaw,
     explainPrediction,
-    transformScanResponse,
+    transformScanRawResponse,
     transformExplainResponse,
 } from '@/lib/api';
 import DrawingCanvas from '@/components/DrawingCanvas';
@@ -48,8 +48,8 @@ export default function Home() {
         setExplainResult(null);
 
         try {
-            const response = await scanImage(canvasDataUrl);
-            const result = transformScanResponse(response);
+            const response = await scanImageRaw(canvasDataUrl);
+            const result = transformScanRawResponse(response);
             setScanResult(result);
             setIsVisualizationActive(true);
 
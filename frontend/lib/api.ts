@@ -13,6 +13,22 @@ export interface ScanResponse {
     prediction: number;
 }
 
+export interface ScanRawResponse {
+    processed_image: string;
+    processed_image_shape: number[];
+    feature_maps_conv1: string;
+    feature_maps_conv1_shape: number[];
+    feature_maps_conv1_scale: number[];
+    feature_maps_conv1_offset: number[];
+    feature_maps_conv2: string;
+    feature_maps_conv2_shape: number[];
+    feature_maps_conv2_scale: number[];
+    feature_maps_conv2_offset: number[];
+    dense_activations: number[];
+    probabilities: number[];
+    prediction: number;
+}
+
 export interface ExplainResponse {
     heatmap: string;
     overlay: string;
@@ -40,6 +56,28 @@ export async function scanImage(imageBase64: string): Promise<ScanResponse> {
     return response.json();
 }
 
+/**
+ * Send an image to the /scan_raw endpoint for analysis.
+ * Feature maps and the processed image are returned as raw uint8 blobs
+ * instead of PNGs.
+ */
+export async function scanImageRaw(imageBase64: string): Promise<ScanRawResponse> {
+    const response = await fetch(`${API_BASE_URL}/scan_raw`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ image: imageBase64 }),
+    });
+
+    if (!response.ok) {
+        const error = await response.json().catch(() => ({ detail: 'Unknown error' }));
+        throw new Error(error.detail || `HTTP error! status: ${response.status}`);
+    }
+
+    return response.json();
+}
+
 /**
  * Send an image to the /explain endpoint for Grad-CAM visualization
  */
@@ -94,6 +132,64 @@ export function transformScanResponse(response: ScanResponse) {
     };
 }
 
+/**
+ * Decode a base64 uint8 blob of shape [maps, height, width] into one
+ * base64 PNG per map, rendered client-side on a canvas
+ */
+export function decodeFeatureMaps(blob: string, shape: number[]): string[] {
+    const [count, height, width] = shape;
+    const bytes = Uint8Array.from(atob(blob), (c) => c.charCodeAt(0));
+
+    const canvas = document.createElement('canvas');
+    canvas.width = width;
+    canvas.height = height;
+    const ctx = canvas.getContext('2d');
+    if (!ctx) return [];
+
+    const imageData = ctx.createImageData(width, height);
+    const pixels = imageData.data;
+    const mapSize = height * width;
+    const maps: string[] = [];
+
+    for (let m = 0; m < count; m++) {
+        const offset = m * mapSize;
+        for (let i = 0; i < mapSize; i++) {
+            const value = bytes[offset + i];
+            pixels[i * 4] = value;
+            pixels[i * 4 + 1] = value;
+            pixels[i * 4 + 2] = value;
+            pixels[i * 4 + 3] = 255;
+        }
+        ctx.putImageData(imageData, 0, 0);
+        maps.push(canvas.toDataURL('image/png').split(',')[1]);
+    }
+
+    return maps;
+}
+
+/**
+ * Transform raw scan API response to store format
+ */
+export function transformScanRawResponse(response: ScanRawResponse) {
+    return {
+        processedImage: decodeFeatureMaps(
+            response.processed_image,
+            [1, ...response.processed_image_shape]
+        )[0],
+        featureMapsConv1: decodeFeatureMaps(
+            response.feature_maps_conv1,
+            response.feature_maps_conv1_shape
+        ),
+        featureMapsConv2: decodeFeatureMaps(
+            response.feature_maps_conv2,
+            response.feature_maps_conv2_shape
+        ),
+        denseActivations: response.dense_activations,
+        probabilities: response.probabilities,
+        prediction: response.prediction,
+    };
+}
+
 /**
  * Transform explain API response to store format
  */